@@ -1,32 +1,156 @@
 import streamlit as st
-from transformers import T5Tokenizer, T5ForConditionalGeneration
-from src.extract_data import list_files_in_container, get_blob_data, preprocess_text, extract_resume_data
+import os
+import glob
+import shutil
+import torch
+from transformers import T5Tokenizer, T5ForConditionalGeneration, BitsAndBytesConfig
+from transformers.modeling_outputs import BaseModelOutput
+from optimum.onnxruntime import ORTModelForSeq2SeqLM
+import onnxruntime
+from src.extract_data import list_files_in_container, get_blob_etag, get_blob_data, preprocess_text, extract_resume_data
+from src.similarity import sparse_cosine, vectorize
 import logging
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from collections import OrderedDict
+from sentence_transformers import SentenceTransformer
 import numpy as np
 
 logging.basicConfig(level=logging.DEBUG)
 
+torch.set_num_threads(max(1, (os.cpu_count() or 2) // 2))
+device = 'cuda' if torch.cuda.is_available() else 'cpu'
+
+# Exported ONNX graphs are saved here so the export only runs once per model.
+ONNX_MODEL_DIR = os.path.join('models', 'onnx')
+
+# Number of questions whose encoder outputs are kept per session.
+ENCODER_CACHE_SIZE = 8
+
 st.set_page_config(page_title="Resume Data Extraction and Q&A", layout="centered", initial_sidebar_state="expanded")
 
 if 'submit_resume_clicked' not in st.session_state:
     st.session_state.submit_resume_clicked = False
 if 'submit_question_clicked' not in st.session_state:
     st.session_state.submit_question_clicked = False
+if 'encoder_outputs_cache' not in st.session_state:
+    st.session_state.encoder_outputs_cache = OrderedDict()
+    st.session_state.encoder_outputs_key = None
+if 'resume_vector_cache' not in st.session_state:
+    st.session_state.resume_vector_cache = {}
+
+@st.cache_data(ttl=300, show_spinner=False)
+def list_resume_files(container_name):
+    return list_files_in_container(container_name)
 
-def load_model(model_name):
+@st.cache_data(show_spinner=False)
+def load_blob_data(blob_name, container_name, etag):
+    # etag is only part of the cache key, so a changed blob is downloaded again.
+    # Raising keeps a failed download out of the cache.
+    pdf_text = get_blob_data(blob_name, container_name)
+    if not pdf_text:
+        raise ValueError(f"No data extracted from {blob_name}.")
+    return pdf_text
+
+def get_resume_text(blob_name, container_name):
+    etag = get_blob_etag(blob_name, container_name)
+    if etag is None:
+        # Without an ETag the cache cannot tell when the blob changes, so read it uncached.
+        return get_blob_data(blob_name, container_name)
     try:
-        tokenizer = T5Tokenizer.from_pretrained(model_name)
+        return load_blob_data(blob_name, container_name, etag)
+    except ValueError:
+        return ""
+
+@st.cache_data(show_spinner=False)
+def load_preprocessed_text(text):
+    return preprocess_text(text)
+
+@st.cache_data(show_spinner=False)
+def load_resume_data(text):
+    return extract_resume_data(text)
+
+@st.cache_resource(show_spinner=False)
+def load_embedding_model():
+    # int8-quantized ONNX export published with the checkpoint.
+    return SentenceTransformer(
+        'sentence-transformers/all-MiniLM-L6-v2',
+        backend='onnx',
+        model_kwargs={'file_name': 'onnx/model_quint8_avx2.onnx'}
+    )
+
+def load_onnx_model(model_name, provider):
+    onnx_path = os.path.join(ONNX_MODEL_DIR, model_name)
+    if glob.glob(os.path.join(onnx_path, '*.onnx')):
+        try:
+            return ORTModelForSeq2SeqLM.from_pretrained(onnx_path, use_cache=True, use_merged=True, provider=provider)
+        except Exception as e:
+            logging.warning(f"Saved ONNX model at {onnx_path} could not be loaded, exporting again: {e}")
+
+    model = ORTModelForSeq2SeqLM.from_pretrained(model_name, export=True, use_cache=True, use_merged=True, provider=provider)
+
+    # Save to a temporary directory and swap it in, so an interrupted save never leaves a partial export behind.
+    tmp_path = onnx_path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    model.save_pretrained(tmp_path)
+    shutil.rmtree(onnx_path, ignore_errors=True)
+    os.replace(tmp_path, onnx_path)
+    logging.info(f"Exported ONNX model saved to {onnx_path}.")
+    return model
+
+@st.cache_resource(show_spinner=False)
+def load_model(model_name, use_onnx=True, quantize=True):
+    # Errors propagate so that a failed load is not cached and the next rerun tries again.
+    tokenizer = T5Tokenizer.from_pretrained(model_name)
+    if use_onnx:
+        # Merged decoder graph with KV cache, exported on first use and loaded from disk afterwards.
+        # The CUDA provider is only present with onnxruntime-gpu, so check what is installed.
+        use_cuda_provider = device == 'cuda' and 'CUDAExecutionProvider' in onnxruntime.get_available_providers()
+        provider = 'CUDAExecutionProvider' if use_cuda_provider else 'CPUExecutionProvider'
+        model = load_onnx_model(model_name, provider)
+    elif quantize and device == 'cuda':
+        # bitsandbytes int8 weights; placement is handled by device_map.
+        model = T5ForConditionalGeneration.from_pretrained(
+            model_name,
+            device_map='auto',
+            quantization_config=BitsAndBytesConfig(load_in_8bit=True)
+        ).eval()
+    else:
         model = T5ForConditionalGeneration.from_pretrained(model_name)
-        logging.info("Model and tokenizer loaded successfully.")
-        return tokenizer, model
-    except Exception as e:
-        logging.error(f"Error loading model: {e}")
-        st.error(f"Error loading model: {e}")
-        return None, None
+        if device == 'cuda':
+            # T5 overflows in fp16, so half precision uses bf16 where the GPU supports it.
+            if torch.cuda.is_bf16_supported():
+                model = model.to(torch.bfloat16)
+        elif quantize:
+            # Dynamic int8 quantization of the Linear projections in every T5 block.
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        model = model.to(device).eval()
+    logging.info(f"Model and tokenizer loaded successfully (onnx={use_onnx}, quantize={quantize}).")
+    return tokenizer, model
+
+def get_encoder_outputs(model, model_key, inputs, context, question):
+    # The encoder output only depends on the model and the (context, question) input, so the
+    # last few questions are kept; the cache is reset whenever the model or the resume changes.
+    cache = st.session_state.encoder_outputs_cache
+    cache_key = (model_key, hash(context))
+    if st.session_state.encoder_outputs_key != cache_key:
+        cache.clear()
+        st.session_state.encoder_outputs_key = cache_key
+
+    if question in cache:
+        cache.move_to_end(question)
+    else:
+        with torch.inference_mode():
+            cache[question] = model.get_encoder()(
+                input_ids=inputs['input_ids'],
+                attention_mask=inputs['attention_mask']
+            ).last_hidden_state
+        if len(cache) > ENCODER_CACHE_SIZE:
+            cache.popitem(last=False)
+        logging.debug("Encoder outputs computed and cached.")
+    # generate() expands encoder outputs for beam search in place, so each call gets a fresh wrapper
+    # around the cached tensor instead of the cached object itself.
+    return BaseModelOutput(last_hidden_state=cache[question])
 
-def answer_question(tokenizer, model, context, question, max_length=150, num_beams=4):
+def answer_question(tokenizer, model, model_key, context, question, max_new_tokens=64, num_beams=1):
     try:
         if not question.strip():
             st.error("Question cannot be empty.")
@@ -37,16 +161,28 @@ def answer_question(tokenizer, model, context, question, max_length=150, num_bea
         logging.debug(f"Model input text: {input_text}")
 
         inputs = tokenizer(input_text, return_tensors='pt', truncation=True, max_length=1024)
+        inputs = {k: v.to(model.device) for k, v in inputs.items()}
         logging.debug(f"Tokenized inputs: {inputs}")
 
-        outputs = model.generate(
-            inputs['input_ids'],
-            max_length=max_length,
-            num_beams=num_beams,
-            early_stopping=True
-        )
+        with torch.inference_mode():
+            encoder_outputs = get_encoder_outputs(model, model_key, inputs, context, question)
+
+            outputs = model.generate(
+                inputs['input_ids'],
+                attention_mask=inputs['attention_mask'],
+                encoder_outputs=encoder_outputs,
+                max_new_tokens=max_new_tokens,
+                num_beams=num_beams,
+                do_sample=False,
+                no_repeat_ngram_size=3,
+                early_stopping=num_beams > 1,
+                use_cache=True,
+                return_dict_in_generate=False,
+                output_attentions=False,
+                output_hidden_states=False
+            )
         
-        answer = tokenizer.decode(outputs[0], skip_special_tokens=True)
+        answer = tokenizer.batch_decode(outputs, skip_special_tokens=True)[0]
         logging.info(f"Generated answer: {answer}")
         return answer.strip()
     except Exception as e:
@@ -54,15 +190,41 @@ def answer_question(tokenizer, model, context, question, max_length=150, num_bea
         st.error(f"Error generating answer: {e}")
         return ""
 
-def compute_similarity(resume_text, job_description):
+def embed(text):
+    # The encoder truncates at max_seq_length word pieces, so long texts are embedded in
+    # chunks that fit and the mean of the chunk embeddings is used.
+    embedding_model = load_embedding_model()
+    window = embedding_model.max_seq_length - 2  # room for [CLS] and [SEP]
+    token_ids = embedding_model.tokenizer(text, add_special_tokens=False)['input_ids']
+    chunks = [
+        embedding_model.tokenizer.decode(token_ids[i:i + window])
+        for i in range(0, len(token_ids), window)
+    ] or [text]
+
+    embeddings = embedding_model.encode(chunks, normalize_embeddings=True)
+    pooled = embeddings.mean(axis=0)
+    return pooled / max(np.linalg.norm(pooled), 1e-12)
+
+def compute_similarity(resume_text, job_description, method='lexical'):
     try:
-        vectorizer = TfidfVectorizer(min_df=1, stop_words='english', ngram_range=(1, 2), norm='l2')
-        vectors = vectorizer.fit_transform([resume_text, job_description])
-        similarity_matrix = cosine_similarity(vectors)
+        # The resume side is computed once per resume and method; only the job description is new per click.
+        encode = embed if method == 'semantic' else vectorize
+        cache = st.session_state.resume_vector_cache
+        resume_key = hash(resume_text)
+        cached = cache.get(method)
+        if cached is None or cached[0] != resume_key:
+            cache[method] = (resume_key, encode(resume_text))
+        resume_vector = cache[method][1]
+        job_vector = encode(job_description)
 
-        similarity_score = round(similarity_matrix[0, 1] * 100, 2)
-        logging.info(f"Similarity score computed: {similarity_score}")
-        return similarity_score*3
+        if method == 'semantic':
+            score = float(np.dot(resume_vector, job_vector))
+        else:
+            score = sparse_cosine(resume_vector.indices, resume_vector.data, job_vector.indices, job_vector.data)
+
+        similarity_score = round(score * 100, 2)
+        logging.info(f"Similarity score computed ({method}): {similarity_score}")
+        return similarity_score
     except Exception as e:
         logging.error(f"Error computing similarity: {e}")
         st.error(f"Error computing similarity: {e}")
@@ -71,18 +233,26 @@ def compute_similarity(resume_text, job_description):
 def main():
     st.title("📄 Resume Q&A Chatbot")
 
-    model_name = 't5-large'
-    tokenizer, model = load_model(model_name)
-
-    if not tokenizer or not model:
-        st.error("Model and tokenizer could not be loaded.")
+    model_name = st.sidebar.selectbox("Model", ['t5-base', 't5-large'], index=0)
+    use_onnx = st.sidebar.checkbox("Use ONNX Runtime", value=True)
+    quantize = st.sidebar.checkbox("Quantize PyTorch weights to int8", value=True, disabled=use_onnx)
+    num_beams = st.sidebar.slider("Beam search width", min_value=1, max_value=4, value=1)
+    try:
+        tokenizer, model = load_model(model_name, use_onnx, quantize)
+    except Exception as e:
+        st.error(f"Error loading model: {e}")
+        logging.error(f"Error loading model: {e}")
         return
+    model_key = (model_name, use_onnx, quantize)
 
     st.subheader("Select a Resume File")
     container_name = 'nlp'
 
     try:
-        files = list_files_in_container(container_name)
+        files = list_resume_files(container_name)
+        if not files:
+            # An empty listing may be a transient failure, so don't keep it for the whole TTL.
+            list_resume_files.clear()
         logging.debug(f"Files in container '{container_name}': {files}")
     except Exception as e:
         st.error(f"Error fetching files from container: {e}")
@@ -102,19 +272,25 @@ def main():
                 st.subheader("Extract Resume Data")
                 with st.spinner("Processing file..."):
                     try:
-                        extracted_content = get_blob_data(selected_file, container_name)
+                        extracted_content = get_resume_text(selected_file, container_name)
                         if extracted_content:
-                            preprocessed_content = preprocess_text(extracted_content)
-                            resume_data = extract_resume_data(preprocessed_content)
+                            preprocessed_content = load_preprocessed_text(extracted_content)
+                            resume_data = load_resume_data(preprocessed_content)
                             logging.debug(f"Extracted resume data: {resume_data}")
 
                             st.subheader("Compare with Job Description")
                             job_description = st.text_area("Enter Job Description")
+                            similarity_method = st.radio(
+                                "Similarity method",
+                                ['lexical', 'semantic'],
+                                format_func=lambda m: "Lexical (term overlap)" if m == 'lexical' else "Semantic (MiniLM embeddings)",
+                                horizontal=True
+                            )
 
                             if st.button("Compute Similarity"):
                                 if job_description.strip():
                                     with st.spinner("Calculating similarity..."):
-                                        similarity_score = compute_similarity(preprocessed_content, job_description)
+                                        similarity_score = compute_similarity(preprocessed_content, job_description, similarity_method)
                                         st.success(f"**Similarity Score:** {similarity_score:.2f}%")
                                 else:
                                     st.error("Please enter a job description.")
@@ -124,7 +300,7 @@ def main():
 
                             if st.button("Submit Question"):
                                 st.session_state.submit_question_clicked = True
-                                handle_question(question, tokenizer, model, preprocessed_content)
+                                handle_question(question, tokenizer, model, model_key, preprocessed_content, num_beams)
                         else:
                             st.warning("No data extracted from the file.")
                             logging.warning("No data extracted from the file.")
@@ -138,11 +314,11 @@ def main():
         st.warning("No files found in the specified container.")
         logging.warning("No files found in the specified container.")
 
-def handle_question(question, tokenizer, model, preprocessed_content):
+def handle_question(question, tokenizer, model, model_key, preprocessed_content, num_beams=1):
     if st.session_state.submit_question_clicked:  
         if question.strip():
             logging.info(f"Question asked: {question}")
-            answer = answer_question(tokenizer, model, preprocessed_content, question)
+            answer = answer_question(tokenizer, model, model_key, preprocessed_content, question, num_beams=num_beams)
             st.write("**Answer:**", answer)
             st.session_state.submit_question_clicked = False  
         else:
@@ -2,7 +2,7 @@ from azure.identity import ClientSecretCredential
 from azure.storage.blob import BlobServiceClient
 from dotenv import load_dotenv
 import os
-import PyPDF2
+import pypdfium2 as pdfium
 from io import BytesIO
 
 
@@ -30,15 +30,23 @@ def get_blob_data():
     # Get the blob client
     blob_client = container_client.get_blob_client(blob=blob_name)
     
-    # Download blob data as bytes
-    pdf_data = blob_client.download_blob().readall()
-
-    # Read PDF data using PyPDF2
-    pdf_text = ''
-    with BytesIO(pdf_data) as pdf_file:
-        reader = PyPDF2.PdfReader(pdf_file)
-        for page in reader.pages:
-            pdf_text += page.extract_text()
+    # Stream blob data into an in-memory buffer
+    with BytesIO() as pdf_file:
+        blob_client.download_blob().readinto(pdf_file)
+        pdf_file.seek(0)
+
+        # Read PDF data using pypdfium2
+        pdf = pdfium.PdfDocument(pdf_file)
+        try:
+            pages = []
+            for page in pdf:
+                text_page = page.get_textpage()
+                pages.append(text_page.get_text_range())
+                text_page.close()
+                page.close()
+        finally:
+            pdf.close()
+    pdf_text = ''.join(pages)
 
     
     output_file_path = 'extracted_context.txt'
@@ -1,12 +1,12 @@
 import re
 import os
+import functools
 import spacy
-from spacy.matcher import Matcher
 from io import BytesIO
 from azure.identity import ClientSecretCredential
 from azure.storage.blob import BlobServiceClient
 from dotenv import load_dotenv
-import PyPDF2
+import pypdfium2 as pdfium
 
 load_dotenv()
 client_id = os.environ['AZURE_CLIENT_ID']
@@ -20,6 +20,88 @@ credentials = ClientSecretCredential(
     tenant_id=tenant_id
 )
 
+# SpaCy models by size; get_nlp falls back to smaller ones when a model is not installed.
+SPACY_MODELS = {
+    "trf": "en_core_web_trf",
+    "lg": "en_core_web_lg",
+    "sm": "en_core_web_sm",
+}
+SPACY_MODEL_LEVEL = os.environ.get("SPACY_MODEL_LEVEL", "lg").strip().lower()
+USE_TRF_FOR_NAME = os.environ.get("USE_TRF_FOR_NAME", "false").lower() in ("1", "true", "yes")
+
+_EMAIL_PATTERN = r"[\w\.-]+@[\w\.-]+"
+_PHONE_PATTERN = r"[\+\(]?[1-9][0-9 .\-\(\)]{8,}[0-9]"
+_URL_PATTERN = r"https?://[^\s]+|linkedin\.com/[^\s]+"
+
+_EMAIL_RE = re.compile(_EMAIL_PATTERN)
+_PHONE_RE = re.compile(_PHONE_PATTERN)
+_URL_RE = re.compile(_URL_PATTERN)
+_WS_RE = re.compile(r'\s+')
+_SECTION_RE = re.compile(
+    r"\b(education|experience|skills|interests|extracurricular\s+activities|key\s+achievements|personal\s+statement)\b",
+    re.I
+)
+
+SECTION_CATEGORIES = {
+    "education": "Education",
+    "experience": "Experience",
+    "skills": "SKILLS, INTERESTS AND EXTRACURRICULAR ACTIVITIES",
+    "interests": "SKILLS, INTERESTS AND EXTRACURRICULAR ACTIVITIES",
+    "extracurricular activities": "SKILLS, INTERESTS AND EXTRACURRICULAR ACTIVITIES",
+    "key achievements": "Key Achievements",
+    "personal statement": "Personal Statement",
+}
+_CONTACT_RE = re.compile(
+    rf"(?P<email>{_EMAIL_PATTERN})|(?P<phone>{_PHONE_PATTERN})|(?P<url>{_URL_PATTERN})"
+)
+
+@functools.lru_cache(maxsize=1)
+def get_blob_service_client():
+    """
+    Returns a process-wide BlobServiceClient, created on first use.
+
+    Returns:
+    - BlobServiceClient: Client authenticated against the configured storage account.
+    """
+    return BlobServiceClient(account_url=account_url, credential=credentials)
+
+@functools.lru_cache(maxsize=None)
+def get_container_client(container_name):
+    """
+    Returns a ContainerClient for the given container, reused across calls.
+
+    Parameters:
+    - container_name (str): Name of the Azure Blob Storage container.
+
+    Returns:
+    - ContainerClient: Client for the container.
+    """
+    return get_blob_service_client().get_container_client(container=container_name)
+
+@functools.lru_cache(maxsize=None)
+def get_nlp(level=SPACY_MODEL_LEVEL):
+    """
+    Loads the SpaCy pipeline for the given size once and returns the same Language object on every call.
+
+    Parameters:
+    - level (str): One of 'trf', 'lg' or 'sm'. Smaller models are tried if the requested one is not installed.
+
+    Returns:
+    - Language: The loaded SpaCy pipeline.
+    """
+    level = level.lower()
+    if level not in SPACY_MODELS:
+        raise ValueError(f"Unknown SpaCy model level '{level}', expected one of: {', '.join(SPACY_MODELS)}")
+
+    levels = list(SPACY_MODELS)
+    for candidate in levels[levels.index(level):]:
+        try:
+            # Lemmas are never used, so skip the components that produce them.
+            return spacy.load(SPACY_MODELS[candidate], disable=["attribute_ruler", "lemmatizer"])
+        except OSError:
+            print(f"SpaCy model {SPACY_MODELS[candidate]} is not installed, trying a smaller one")
+    raise OSError(f"No SpaCy model available for level '{level}'")
+
 def list_files_in_container(container_name):
     """
     Lists all PDF files available in the specified Azure Blob Storage container.
@@ -31,11 +113,10 @@ def list_files_in_container(container_name):
     - list: List of file names available in the container.
     """
     try:
-        blob_service_client = BlobServiceClient(account_url=account_url, credential=credentials)
-        container_client = blob_service_client.get_container_client(container=container_name)
+        container_client = get_container_client(container_name)
 
-        blobs = container_client.list_blobs()
-        files = [blob.name for blob in blobs if blob.name.endswith('.pdf')]  
+        blobs = container_client.list_blobs(results_per_page=500)
+        files = [blob.name for blob in blobs if blob.name.endswith('.pdf')]
 
         return files
 
@@ -43,6 +124,25 @@ def list_files_in_container(container_name):
         print(f"Error listing files: {e}")
         return []  
 
+def get_blob_etag(blob_name, container_name='nlp'):
+    """
+    Retrieves the ETag of a blob, which changes whenever the blob's content changes.
+
+    Parameters:
+    - blob_name (str): The name of the file in Azure Blob Storage.
+    - container_name (str): The container in Azure Blob Storage where the file resides.
+
+    Returns:
+    - str or None: The blob's ETag, or None if it could not be retrieved.
+    """
+    try:
+        blob_client = get_container_client(container_name).get_blob_client(blob=blob_name)
+        return blob_client.get_blob_properties().etag
+
+    except Exception as e:
+        print(f"Error reading blob properties: {e}")
+        return None
+
 def get_blob_data(blob_name, container_name='nlp'):
     """
     Retrieves PDF data from Azure Blob Storage and extracts text from it.
@@ -56,21 +156,26 @@ def get_blob_data(blob_name, container_name='nlp'):
     """
     try:
         
-        blob_service_client = BlobServiceClient(account_url=account_url, credential=credentials)
-        container_client = blob_service_client.get_container_client(container=container_name)
+        container_client = get_container_client(container_name)
         blob_client = container_client.get_blob_client(blob=blob_name)
     
         
-        pdf_data = blob_client.download_blob().readall()
-
-        
-        with BytesIO(pdf_data) as pdf_file:
-            reader = PyPDF2.PdfReader(pdf_file)
-            pdf_text = ''
-            for page in reader.pages:
-                pdf_text += page.extract_text()
-
-        return pdf_text
+        # Stream the download straight into the buffer the PDF reader consumes.
+        with BytesIO() as pdf_file:
+            blob_client.download_blob().readinto(pdf_file)
+            pdf_file.seek(0)
+            pdf = pdfium.PdfDocument(pdf_file)
+            try:
+                pages = []
+                for page in pdf:
+                    text_page = page.get_textpage()
+                    pages.append(text_page.get_text_range())
+                    text_page.close()
+                    page.close()
+            finally:
+                pdf.close()
+
+        return ''.join(pages)
 
     except Exception as e:
         print(f"Error downloading or reading file: {e}")
@@ -87,7 +192,7 @@ def preprocess_text(text):
     - str: Preprocessed text.
     """
     text = text.lower()
-    text = re.sub(r'\s+', ' ', text)  
+    text = _WS_RE.sub(' ', text)
     return text
 
 def extract_email(text):
@@ -100,8 +205,7 @@ def extract_email(text):
     Returns:
     - str or None: The extracted email address if found, otherwise None.
     """
-    pattern = r"[\w\.-]+@[\w\.-]+"
-    match = re.search(pattern, text)
+    match = _EMAIL_RE.search(text)
     if match:
         return match.group()
     return None
@@ -116,24 +220,40 @@ def extract_phone_number(text):
     Returns:
     - str or None: The extracted phone number if found, otherwise None.
     """
-    pattern = r"[\+\(]?[1-9][0-9 .\-\(\)]{8,}[0-9]"
-    match = re.search(pattern, text)
+    match = _PHONE_RE.search(text)
     if match:
         return match.group()
     return None
 
-def extract_name(text):
+def extract_contact(text):
+    """
+    Extracts the first email address, phone number and portfolio/LinkedIn URL in a single scan of the text.
+
+    Parameters:
+    - text (str): The text from which to extract contact details.
+
+    Returns:
+    - dict: A dictionary with 'email', 'phone' and 'url' keys; values are None when not found.
+    """
+    contact = {"email": None, "phone": None, "url": None}
+    for match in _CONTACT_RE.finditer(text):
+        kind = match.lastgroup
+        if contact[kind] is None:
+            contact[kind] = match.group()
+            if all(contact.values()):
+                break
+    return contact
+
+def extract_name(doc):
     """
-    Extracts the name from the provided text using SpaCy's Named Entity Recognition.
+    Extracts the name from the provided document using SpaCy's Named Entity Recognition.
 
     Parameters:
-    - text (str): The text from which to extract a name.
+    - doc (Doc): The SpaCy Document from which to extract a name.
 
     Returns:
     - str or None: The extracted name if found, otherwise None.
     """
-    nlp = spacy.load("en_core_web_trf")  # Load SpaCy model
-    doc = nlp(text)
     names = [ent.text for ent in doc.ents if ent.label_ == "PERSON"]
     
     if names:
@@ -151,94 +271,122 @@ def extract_portfolio_linkedin(text):
     Returns:
     - str or None: The extracted URL if found, otherwise None.
     """
-    pattern = r"(https?://[^\s]+)|(linkedin\.com/[^\s]+)"
-    match = re.search(pattern, text)
+    match = _URL_RE.search(text)
     if match:
         return match.group()
     return None
 
-def get_nlp_doc(text):
+def get_nlp_doc(text, level=SPACY_MODEL_LEVEL):
     """
     Processes the provided text with SpaCy to create a SpaCy Document object.
 
     Parameters:
     - text (str): The text to process.
+    - level (str): Size of the SpaCy model to use ('trf', 'lg' or 'sm').
 
     Returns:
     - Doc: A SpaCy Document object.
     """
-    nlp = spacy.load("en_core_web_trf")  # Transformer-based model
+    nlp = get_nlp(level)
     return nlp(text)
 
 def extract_categories(text):
     """
-    Extracts and categorizes different sections of the resume based on predefined keywords using SpaCy's Matcher.
+    Extracts and categorizes different sections of the resume based on predefined section headers.
 
     Parameters:
     - text (str): The resume text.
 
     Returns:
-    - dict: A dictionary with keys as categories and values as the extracted text for each category.
-    """
-    nlp = spacy.load("en_core_web_trf")  # Transformer-based model
-    matcher = Matcher(nlp.vocab)
-
-    patterns = {
-        "Education": [[{"LOWER": "education"}]],
-        "Experience": [[{"LOWER": "experience"}]],
-        "SKILLS, INTERESTS AND EXTRACURRICULAR ACTIVITIES": [
-            [{"LOWER": "skills"}],
-            [{"LOWER": "interests"}],
-            [{"LOWER": "extracurricular"}, {"LOWER": "activities"}],
-        ],
-        "Key Achievements": [[{"LOWER": "key"}, {"LOWER": "achievements"}]],
-        "Personal Statement": [[{"LOWER": "personal"}, {"LOWER": "statement"}]],
-    }
-
-    for category, pattern in patterns.items():
-        matcher.add(category, pattern)
-
-    doc = get_nlp_doc(text)
-    matches = matcher(doc)
-    categories = {category: "" for category in patterns.keys()}
-    start_pos = {category: None for category in patterns.keys()}
+    - dict: A dictionary with keys as categories and values as the (start, end) character offsets of each category, or None if absent.
+    """
+    start_pos = {category: None for category in SECTION_CATEGORIES.values()}
 
-    for match_id, start, end in matches:
-        rule_id = nlp.vocab.strings[match_id]  
-        start_pos[rule_id] = start
+    # As with the previous Matcher rules, the last header found for a category marks where it starts.
+    for match in _SECTION_RE.finditer(text):
+        keyword = _WS_RE.sub(' ', match.group(1).lower())
+        start_pos[SECTION_CATEGORIES[keyword]] = match.start()
 
+    categories = {category: None for category in start_pos}
     for category, pos in start_pos.items():
         if pos is not None:
-            end_pos = len(doc)  
+            end_pos = len(text)
             for other_cat, other_pos in start_pos.items():
                 if other_pos is not None and other_pos > pos:
                     end_pos = min(end_pos, other_pos)
-            span = doc[pos:end_pos]  
-            categories[category] = span.text.strip().replace(
-                category.upper() + "\n\n", ""
-            )
+            categories[category] = (pos, end_pos)
 
     return categories
 
-def extract_experiences(doc):
+def get_category_text(text, categories, category):
+    """
+    Returns the text of a category found by extract_categories.
+
+    Parameters:
+    - text (str): The resume text passed to extract_categories.
+    - categories (dict): Category offsets as returned by extract_categories.
+    - category (str): The category to read.
+
+    Returns:
+    - str: The category text, or an empty string if the category was not found.
+    """
+    offsets = categories.get(category)
+    if offsets is None:
+        return ""
+    start, end = offsets
+    return text[start:end].strip().replace(category.upper() + "\n\n", "")
+
+def get_category_span(doc, categories, category):
+    """
+    Returns the SpaCy Span of a category found by extract_categories.
+
+    Parameters:
+    - doc (Doc): A SpaCy Document object built from the resume text passed to extract_categories.
+    - categories (dict): Category offsets as returned by extract_categories.
+    - category (str): The category to read.
+
+    Returns:
+    - Span or None: The Span covering the category, or None if the category was not found.
+    """
+    offsets = categories.get(category)
+    if offsets is None:
+        return None
+    start, end = offsets
+    return doc.char_span(start, end, alignment_mode="expand")
+
+def extract_experiences(span):
     """
     Extracts detailed work experiences from the 'Experience' section of a resume.
 
     Parameters:
-    - doc (Doc): A SpaCy Document object containing the 'Experience' section text.
+    - span (Span or None): The SpaCy Span covering the 'Experience' section.
 
     Returns:
     - list: A list of dictionaries, each representing an extracted work experience.
     """
-    nlp = spacy.load("en_core_web_trf") 
-    doc = nlp(doc["Experience"])
-
     experiences = []
-    index = -1
-    for sent in doc.sents:
-        labels = [ent.label_ for ent in sent.ents]
+    if span is None:
+        return experiences
 
-        if "DATE" in labels and "ORG" in labels and "GPE" in labels:
+    # Description fragments are collected per entry and joined once at the end.
+    description_parts = []
+    index = -1
+    for sent in span.sents:
+        # Span.sents yields whole sentences, which can run across section headers; keep only this section.
+        sent = span.doc[max(sent.start, span.start):min(sent.end, span.end)]
+        date = org = place = None
+        has_org = False
+        for ent in sent.ents:
+            if ent.label_ == "DATE":
+                date = date or ent.text
+            elif ent.label_ == "ORG":
+                has_org = True
+                if org is None and "experience" not in ent.text.lower():
+                    org = ent.text
+            elif ent.label_ == "GPE":
+                place = place or ent.text
+
+        if date is not None and has_org and place is not None:
             experiences.append(
                 {
                     "date": "",
@@ -250,27 +398,19 @@ def extract_experiences(doc):
                 }
             )
 
+            description_parts.append([])
             index += 1
 
-            date = [ent.text for ent in sent.ents if ent.label_ == "DATE"]
-            experiences[index]["date"] = date[0] if date else "N/A"
-
-            org = [
-                ent.text
-                for ent in sent.ents
-                if ent.label_ == "ORG" and "experience" not in ent.text.lower()
-            ]
-            experiences[index]["org-name"] = org[0] if org else "N/A"
-
-            place = [ent.text for ent in sent.ents if ent.label_ == "GPE"]
-            experiences[index]["place"] = place[0] if place else "N/A"
+            experiences[index]["date"] = date
+            experiences[index]["org-name"] = org if org is not None else "N/A"
+            experiences[index]["place"] = place
 
             sent_split = sent.text.split("\n")
             sent_split = [s for s in sent_split if s.strip() and "experience" not in s.lower()]
 
             if len(sent_split) > 1:
                 role = sent_split[0].split(",")[3] if len(sent_split[0].split(",")) > 3 else "N/A"
-                experiences[index]["role"] = role.replace(date[0], "").strip()
+                experiences[index]["role"] = role.replace(date, "").strip()
 
                 org_description = sent_split[1] if len(sent_split) > 1 else "N/A"
                 experiences[index]["org-description"] = org_description
@@ -280,31 +420,45 @@ def extract_experiences(doc):
 
         else:
             if index >= 0:
-                experiences[index]["description"] += sent.text.replace("\n", " ") + " "
+                description_parts[index].append(sent.text.replace("\n", " ") + " ")
             else:
                 print("No date, org, or place found in the sentence")
 
+    for experience, parts in zip(experiences, description_parts):
+        experience["description"] = "".join(parts)
+
     return experiences
 
-def extract_education(doc):
+def extract_education(span):
     """
     Extracts detailed educational information from the 'Education' section of a resume.
 
     Parameters:
-    - doc (Doc): A SpaCy Document object containing the 'Education' section text.
+    - span (Span or None): The SpaCy Span covering the 'Education' section.
 
     Returns:
     - list: A list of dictionaries, each representing extracted educational details.
     """
-    nlp = spacy.load("en_core_web_trf")
-    doc = nlp(doc["Education"])
-
     education = []
-    index = -1
-    for sent in doc.sents:
-        labels = [ent.label_ for ent in sent.ents]
+    if span is None:
+        return education
 
-        if "DATE" in labels and "ORG" in labels and "GPE" in labels:
+    # Description fragments are collected per entry and joined once at the end.
+    description_parts = []
+    index = -1
+    for sent in span.sents:
+        # Span.sents yields whole sentences, which can run across section headers; keep only this section.
+        sent = span.doc[max(sent.start, span.start):min(sent.end, span.end)]
+        date = institution = place = None
+        for ent in sent.ents:
+            if ent.label_ == "DATE":
+                date = date or ent.text
+            elif ent.label_ == "ORG":
+                institution = institution or ent.text
+            elif ent.label_ == "GPE":
+                place = place or ent.text
+
+        if date is not None and institution is not None and place is not None:
             education.append(
                 {
                     "date": "",
@@ -317,14 +471,9 @@ def extract_education(doc):
 
             index += 1
 
-            date = [ent.text for ent in sent.ents if ent.label_ == "DATE"]
-            education[index]["date"] = date[0] if date else "N/A"
-
-            institution = [ent.text for ent in sent.ents if ent.label_ == "ORG"]
-            education[index]["institution"] = institution[0] if institution else "N/A"
-
-            place = [ent.text for ent in sent.ents if ent.label_ == "GPE"]
-            education[index]["place"] = place[0] if place else "N/A"
+            education[index]["date"] = date
+            education[index]["institution"] = institution
+            education[index]["place"] = place
 
             sent_split = sent.text.split("\n")
             sent_split = [s for s in sent_split if s.strip() and "education" not in s.lower()]
@@ -334,17 +483,20 @@ def extract_education(doc):
                 education[index]["formation-name"] = formation_name
 
                 description = sent_split[2] if len(sent_split) > 2 else "N/A"
-                education[index]["description"] = "Modules: " + description + " "
+                description_parts.append(["Modules: " + description + " "])
             else:
                 education[index]["formation-name"] = "N/A"
-                education[index]["description"] = "N/A"
+                description_parts.append(["N/A"])
 
         else:
             if index >= 0:
-                education[index]["description"] += sent.text.replace("\n", " ") + " "
+                description_parts[index].append(sent.text.replace("\n", " ") + " ")
             else:
                 print("No date, org, or place found in the sentence")
 
+    for entry, parts in zip(education, description_parts):
+        entry["description"] = "".join(parts)
+
     return education
 
 def extract_resume_data(text):
@@ -357,23 +509,24 @@ def extract_resume_data(text):
     Returns:
     - dict: A dictionary with structured resume data, categorized into education, experience, etc.
     """
-    email = extract_email(text)
-    phone_number = extract_phone_number(text)
-    name = extract_name(text)
-    portfolio_linkedin = extract_portfolio_linkedin(text)
+    contact = extract_contact(text)
+
+    # Run the pipeline once and share the Doc across every SpaCy-based extractor.
+    doc = get_nlp_doc(text)
+    name = extract_name(get_nlp_doc(text, level="trf") if USE_TRF_FOR_NAME else doc)
     categories = extract_categories(text)
 
     data = {
-        "education": extract_education(categories),
-        "experience": extract_experiences(categories),
-        "skills_interests_and_extracurricular_activities": categories.get('SKILLS, INTERESTS AND EXTRACURRICULAR ACTIVITIES', "N/A"),
-        "key_achievements": categories.get('Key Achievements', "N/A"),
-        "personal_statement": categories.get('Personal Statement', "N/A"),
+        "education": extract_education(get_category_span(doc, categories, "Education")),
+        "experience": extract_experiences(get_category_span(doc, categories, "Experience")),
+        "skills_interests_and_extracurricular_activities": get_category_text(text, categories, 'SKILLS, INTERESTS AND EXTRACURRICULAR ACTIVITIES'),
+        "key_achievements": get_category_text(text, categories, 'Key Achievements'),
+        "personal_statement": get_category_text(text, categories, 'Personal Statement'),
         "contact_information": {
             "Name": name,
-            "Email": email,
-            "Phone Number": phone_number,
-            "Portfolio/LinkedIn": portfolio_linkedin
+            "Email": contact["email"],
+            "Phone Number": contact["phone"],
+            "Portfolio/LinkedIn": contact["url"]
         }
     }
 
@@ -1,16 +1,33 @@
-from transformers import Trainer, TrainingArguments, AutoTokenizer, AutoModelForQuestionAnswering
-import json
+from transformers import Trainer, TrainingArguments, AutoTokenizer, AutoModelForQuestionAnswering, DataCollatorWithPadding
+import orjson
 import torch
 import os
 
+# Defined at module level so DataLoader workers can pickle it under the spawn start method.
+class CustomDataset(torch.utils.data.Dataset):
+    def __init__(self, encodings, start_positions, end_positions):
+        self.encodings = encodings
+        self.start_positions = torch.as_tensor(start_positions, dtype=torch.long)
+        self.end_positions = torch.as_tensor(end_positions, dtype=torch.long)
+    
+    def __getitem__(self, idx):
+        # Plain indexing only; the collator pads and converts the token lists.
+        return {key: val[idx] for key, val in self.encodings.items()} | {
+            'start_positions': self.start_positions[idx],
+            'end_positions': self.end_positions[idx]
+        }
+    
+    def __len__(self):
+        return len(self.start_positions)
+
 def fine_tune_model(training_data_path, model_output_dir):
     if not os.path.exists(training_data_path):
         raise FileNotFoundError(f"Training data file not found at {training_data_path}")
     
     try:
-        with open(training_data_path, 'r') as file:
-            training_data = json.load(file)
-    except json.JSONDecodeError as e:
+        with open(training_data_path, 'rb') as file:
+            training_data = orjson.loads(file.read())
+    except orjson.JSONDecodeError as e:
         raise ValueError(f"Error reading JSON from {training_data_path}: {e}")
     except Exception as e:
         raise Exception(f"Unexpected error loading training data: {e}")
@@ -26,18 +43,27 @@ def fine_tune_model(training_data_path, model_output_dir):
         raise Exception(f"Error loading model or tokenizer: {e}")
 
     def tokenize_data(examples):
-        contexts = [ex['context'] for ex in examples]
         questions = [ex['question'] for ex in examples]
         
         try:
-            encodings = tokenizer(
-                contexts, 
-                questions, 
-                truncation=True, 
-                padding='max_length', 
-                max_length=512, 
-                return_tensors='pt'
-            )
+            # Examples usually share one resume context, so each distinct context is tokenized once
+            # and combined with the batch-tokenized questions. Padding is left to the data collator.
+            context_ids = {}
+            for ex in examples:
+                if ex['context'] not in context_ids:
+                    context_ids[ex['context']] = tokenizer(ex['context'], add_special_tokens=False)['input_ids']
+            question_ids = tokenizer(questions, add_special_tokens=False)['input_ids']
+
+            encodings = {}
+            for ex, q_ids in zip(examples, question_ids):
+                pair = tokenizer.prepare_for_model(
+                    context_ids[ex['context']],
+                    q_ids,
+                    truncation=True,
+                    max_length=512
+                )
+                for key, val in pair.items():
+                    encodings.setdefault(key, []).append(val)
         except Exception as e:
             raise Exception(f"Error during tokenization: {e}")
         
@@ -50,10 +76,15 @@ def fine_tune_model(training_data_path, model_output_dir):
         return encodings, start_positions, end_positions
 
     def preprocess_data(data):
+        try:
+            context = data['context']
+            qa_pairs = data['qa_pairs']
+        except KeyError as e:
+            raise KeyError(f"Missing key in training data: {e}")
+
         processed_data = []
-        for item in data:
+        for item in qa_pairs:
             try:
-                context = item['context']
                 question = item['question']
                 answer = item['answer']
             except KeyError as e:
@@ -83,22 +114,12 @@ def fine_tune_model(training_data_path, model_output_dir):
     except Exception as e:
         raise Exception(f"Error in data preparation: {e}")
 
-    class CustomDataset(torch.utils.data.Dataset):
-        def __init__(self, encodings, start_positions, end_positions):
-            self.encodings = encodings
-            self.start_positions = start_positions
-            self.end_positions = end_positions
-        
-        def __getitem__(self, idx):
-            item = {key: torch.tensor(val[idx]) for key, val in self.encodings.items()}
-            item['start_positions'] = torch.tensor(self.start_positions[idx])
-            item['end_positions'] = torch.tensor(self.end_positions[idx])
-            return item
-        
-        def __len__(self):
-            return len(self.start_positions)
-    
     dataset = CustomDataset(tokenized_data, start_positions, end_positions)
+
+    # Mixed precision, TF32, the fused optimizer, checkpointing and loader workers are only used on CUDA;
+    # bf16/TF32 additionally need Ampere or newer. On CPU this is the previous FP32 setup.
+    use_cuda = torch.cuda.is_available()
+    use_bf16 = use_cuda and torch.cuda.is_bf16_supported()
     
     training_args = TrainingArguments(
         output_dir=model_output_dir,
@@ -108,14 +129,23 @@ def fine_tune_model(training_data_path, model_output_dir):
         logging_steps=10,
         save_steps=100,  
         evaluation_strategy="steps",
-        save_total_limit=2  
+        save_total_limit=2,
+        bf16=use_bf16,
+        fp16=use_cuda and not use_bf16,
+        tf32=use_bf16,
+        gradient_checkpointing=use_cuda,
+        optim='adamw_torch_fused' if use_cuda else 'adamw_torch',
+        dataloader_pin_memory=use_cuda,
+        dataloader_num_workers=4 if use_cuda else 0,
+        torch_compile=use_cuda
     )
     
     try:
         trainer = Trainer(
             model=model,
             args=training_args,
-            train_dataset=dataset
+            train_dataset=dataset,
+            data_collator=DataCollatorWithPadding(tokenizer, pad_to_multiple_of=8)
         )
         trainer.train()
     except Exception as e:
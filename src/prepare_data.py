@@ -1,29 +1,29 @@
-import json
+import orjson
 
 def prepare_data(resume_data_path, qa_data_path, output_path):
-    with open(resume_data_path, 'r') as file:
-        resume_data = json.load(file)
+    with open(resume_data_path, 'rb') as file:
+        resume_data = orjson.loads(file.read())
     
-    with open(qa_data_path, 'r') as file:
-        qa_data = json.load(file)
+    with open(qa_data_path, 'rb') as file:
+        qa_data = orjson.loads(file.read())
     
-    context = f"""
+    context_parts = [f"""
     Education:
     {resume_data['education']}
 
     Experience:
-    """
+    """]
     for exp in resume_data['experience']:
-        context += f"""
+        context_parts.append(f"""
         Date: {exp['date']}
         Place: {exp['place']}
         Organization: {exp['org-name']}
         Role: {exp['role']}
         Technologies: {exp['technologies']}
         Description: {exp['description']}
-        """
+        """)
 
-    context += f"""
+    context_parts.append(f"""
     Skills:
     Tools/Languages: {resume_data['skills']['tools_languages']}
     Technologies: {resume_data['skills']['technologies']}
@@ -36,20 +36,17 @@ def prepare_data(resume_data_path, qa_data_path, output_path):
     Email: {resume_data['contact_information']['Email']}
     Phone Number: {resume_data['contact_information']['Phone Number']}
     Portfolio/LinkedIn: {resume_data['contact_information']['Portfolio_LinkedIn']}
-    """
+    """)
+    context = ''.join(context_parts)
 
-    training_data = []
-    for qa in qa_data:
-        question = qa['question']
-        answer = qa['answer']
-        training_data.append({
-            'context': context,
-            'question': question,
-            'answer': answer
-        })
+    # The context is shared by every QA pair, so it is stored once.
+    training_data = {
+        'context': context,
+        'qa_pairs': [{'question': qa['question'], 'answer': qa['answer']} for qa in qa_data]
+    }
     
-    with open(output_path, 'w') as file:
-        json.dump(training_data, file, indent=4)
+    with open(output_path, 'wb') as file:
+        file.write(orjson.dumps(training_data, option=orjson.OPT_INDENT_2))
 
 if __name__ == "__main__":
     prepare_data('data/resume_data.json', 'data/custom_qa.json', 'data/fine_tuning_data.json')
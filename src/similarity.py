@@ -0,0 +1,45 @@
+import numba
+from sklearn.feature_extraction.text import HashingVectorizer
+
+# Stateless, so it can be shared across calls without fitting a vocabulary.
+vectorizer = HashingVectorizer(n_features=2**18, ngram_range=(1, 2), alternate_sign=False, norm='l2', stop_words='english')
+
+@numba.njit(fastmath=True, cache=True)
+def sparse_cosine(indices_a, data_a, indices_b, data_b):
+    """
+    Computes the cosine similarity of two L2-normalised sparse rows.
+
+    Parameters:
+    - indices_a, data_a: Sorted column indices and values of the first CSR row.
+    - indices_b, data_b: Sorted column indices and values of the second CSR row.
+
+    Returns:
+    - float: The cosine similarity, which equals the dot product for normalised rows.
+    """
+    i = 0
+    j = 0
+    dot = 0.0
+    while i < indices_a.shape[0] and j < indices_b.shape[0]:
+        if indices_a[i] == indices_b[j]:
+            dot += data_a[i] * data_b[j]
+            i += 1
+            j += 1
+        elif indices_a[i] < indices_b[j]:
+            i += 1
+        else:
+            j += 1
+    return dot
+
+def vectorize(text):
+    """
+    Hashes the text into an L2-normalised sparse term vector.
+
+    Parameters:
+    - text (str): The text to vectorize.
+
+    Returns:
+    - csr_matrix: A single-row CSR matrix with sorted indices.
+    """
+    vector = vectorizer.transform([text])
+    vector.sort_indices()
+    return vector